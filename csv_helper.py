@@ -6,6 +6,9 @@ import csv
 import logging
 import sys
 
+# read buffer of row_reader(), much larger than the default 8 KB
+_row_reader_buffer_size = 1 << 20
+
 def reader(filename):
     '''Reads a list of lists data from a CSV file.
 
@@ -24,6 +27,21 @@ def reader(filename):
 
     return(content)
 
+def row_reader(filename):
+    '''Reads the rows of a CSV file one at a time, as lists of strings.
+
+    Unlike reader(), no dict is built per row and the file is not loaded
+    into the memory at once. The first row yielded is the header (if the
+    file has one), blank lines are skipped.
+
+    Args:
+        filename: the path (full, or relative) to the file to be read.
+    Yields:
+        A list of strings for each row.'''
+
+    with open(filename, newline='', buffering=_row_reader_buffer_size) as csvfile:
+        yield from (row for row in csv.reader(csvfile, delimiter=';') if row)
+
 def writer(content, filename, has_header=True):
     '''Saves a list of lists data into a CSV file.
 
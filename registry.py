@@ -4,219 +4,295 @@ Library to handle the stock exchange (registry) basic data.
 
 __last_change__ = '2017.09.01.'
 
+import calendar
+import collections
+import collections.abc
 import configparser
 import csv_helper
+import dataclasses
 import datetime
 import decimal
+import functools
 import logging
-import marketdata_coupler as mdc
+import operator
+import re
 import sys
-import teletrader
-import unittest
+import types
 
-config = configparser.ConfigParser()
-config.read('config.ini')
+_ZERO = decimal.Decimal('0')
 
-class Registry(dict):
-    '''Keeps all the basic info of all the stocks together.'''
+# EPS values have only a few significant digits
+_eps_context = decimal.Context(prec=9, rounding=decimal.ROUND_HALF_EVEN)
+
+# an ISIN consists of 12 capital letters or digits
+_isin_match = re.compile('[A-Z0-9]{12}').fullmatch
+
+# the usual date format and its precompiled equivalent
+_dot_date_format = '%Y.%m.%d'
+_dot_date_match = re.compile(r'(\d{4})\.(\d{1,2})\.(\d{1,2})', re.ASCII).fullmatch
+
+# accepted values of the 'Months in Report' column, empty is the same as 0
+_valid_months = frozenset(map(sys.intern, ('', '0', '3', '6', '9', '12')))
+
+# error flags of an ISIN, bits of one int per faulty ISIN
+_FAULTY_ISIN = 1
+_MISSING_NAME = 2
+_FAULTY_MONTHS = 4
+_FAULTY_EXPIRY_DATE = 8
+_TRUNCATED_ROW = 16
+
+_error_descriptions = ((_FAULTY_ISIN, 'Faulty ISINs'),
+                       (_MISSING_NAME, 'Missing names'),
+                       (_FAULTY_MONTHS, 'Faulty months in report'),
+                       (_FAULTY_EXPIRY_DATE, 'Faulty report expiry dates'),
+                       (_TRUNCATED_ROW, 'Truncated rows'))
+
+# the columns of the registry CSV file, in their usual order
+_header = ('ISIN',
+           'Name',
+           'EPS',
+           'Months in Report',
+           'Report Expiry Date',
+           'Own Investor Link',
+           'Stock Exchange Link')
+
+# position of the ISIN within a CSV row, the least number of fields a row
+# must have to contain all the registry columns, a getter returning the rest
+# of the registry columns of a row at once, and the format of the dates
+_Columns = collections.namedtuple('_Columns', ('isin', 'width', 'fields', 'date_format'))
+
+def _columns(header, date_format=_dot_date_format):
+    '''Returns the column accessors of a registry CSV with the given header.
+
+    The positions (and the date format) are resolved only once per file, so
+    processing a row needs no further lookups by column name or in the
+    config.'''
+
+    positions = [header.index(name) for name in _header]
+
+    return _Columns(isin=positions[0],
+                    width=max(positions) + 1,
+                    fields=operator.itemgetter(*positions[1:]),
+                    date_format=date_format)
+
+_default_columns = _columns(_header)
+
+@functools.lru_cache(maxsize=None)
+def _config():
+    '''Returns the registry related settings, read from the config file on
+    first use.'''
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    return types.SimpleNamespace(
+        registry_filename=config['Registry']['Registry filename'],
+        date_format=config['DEFAULT']['Date format'])
+
+class Registry(collections.abc.Mapping):
+    '''Keeps all the basic info of all the stocks together.
+
+    The stock data is held in a plain dict (keyed by ISIN) rather than by
+    subclassing dict, read access is delegated to it. Being a Mapping, the
+    registry provides the usual read-only dict methods (get, keys, items,
+    values).'''
 
     def __init__(self):
         '''Loads the basic data from a CSV file.'''
         logging.info('Registry: Loading basic data from CSV.')
 
-        self['Errors'] = RegistryErrorDict()
+        self._data = {}
+        self.errors = RegistryErrors()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __contains__(self, isin):
+        return isin in self._data
+
+    def __getitem__(self, isin):
+        return self._data[isin]
 
     def load_from_file(self):
         '''Loads the registry CSV file.'''
 
-        self.update( {row['ISIN'] : self._registry_row_from_csv(row)
-                      for row
-                      in csv_helper.reader(config['Registry']['Registry filename'])
-                      if self._registry_row_is_addable(row)})
+        config = _config()
+        rows = csv_helper.row_reader(config.registry_filename)
+        header = next(rows, None)
+
+        if header is not None:
+            col = _columns(header, config.date_format)
+            self._data.update((isin, record)
+                              for isin, record
+                              in (self._process_row(row, col) for row in rows)
+                              if record is not None)
 
         if len(self):
-            if not self['Errors']['Errors found']:
+            if not self.errors.errors_found:
                 logging.info('Registry: %d new ISIN loaded. No errors found.', len(self))
             else:
                 logging.error('Registry: The following errors found:')
+                self.errors.log()
         else:
             logging.error('Registry: No ISIN loaded.')
 
-    def _registry_row_is_addable(self, row):
-        '''Checks one stock data in a dict.'''
+    def _process_row(self, row, col=_default_columns):
+        '''Checks and processes one stock data from a CSV row in a single pass.
 
-        if not row['ISIN']:
-            self['Errors']['Errors found'] = True
-            self['Errors']['Number of missing ISINs'] += 1
-            return False
-        elif len(row['ISIN']) != 12:
-            self['Errors']['Errors found'] = True
-            self['Errors']['Faulty ISINs'].add(row['ISIN'])
-            return False
+        Returns a tuple of the ISIN and the processed stock data, the latter
+        is None if the row is not addable.'''
 
-        if not row['Name']:
-            self['Errors']['Errors found'] = True
-            self['Errors']['Missing names'].add(row['ISIN'])
+        errors = self.errors
 
-        try:
-            months = int(row['Months in Report']) if row['Months in Report'] != '' else 0
-            if months not in (0, 3, 6, 9, 12):
-                raise ValueError
-        except ValueError:
-            self['Errors']['Errors found'] = True
-            self['Errors']['Faulty months in report'].add(row['ISIN'])
+        if len(row) < col.width:
+            isin = row[col.isin] if len(row) > col.isin else ''
+            if isin:
+                errors.flag(isin, _TRUNCATED_ROW)
+            else:
+                errors.missing_isins += 1
+            return isin, None
 
-        try:
-            if row['Report Expiry Date']: datetime.datetime.strptime(row['Report Expiry Date'],
-                                                                     config['DEFAULT']['Date format'])
-        except ValueError:
-            self['Errors']['Errors found'] = True
-            self['Errors']['Faulty report expiry dates'].add(row['ISIN'])
+        isin = row[col.isin]
 
-        return True
+        if not isin:
+            errors.missing_isins += 1
+            return isin, None
+        elif not _isin_match(isin):
+            errors.flag(isin, _FAULTY_ISIN)
+            return isin, None
 
-    def _registry_row_from_csv(self, row):
-        '''Processes one stock data from a dict.'''
+        name, eps, months, expiry, own_link, exchange_link = col.fields(row)
+        # these columns have only a handful of distinct values, interning
+        # makes the stored stock data share them, and the months check hit
+        # the identical objects of _valid_months
+        months = sys.intern(months)
+        expiry = sys.intern(expiry)
+        flags = 0
 
-        return {'Name' : row['Name'],
-                'EPS': _string_to_decimal(row['EPS']),
-                'Months in Report': row['Months in Report'],
-                'Report Expiry Date': row['Report Expiry Date'],
-                'Own Investor Link': row['Own Investor Link'],
-                'Stock Exchange Link': row['Stock Exchange Link']}
+        if not name:
+            flags |= _MISSING_NAME
 
-class RegistryErrorDict(dict):
-    '''Keeps all the error info occuring while processing a registry.'''
+        if months not in _valid_months:
+            flags |= _FAULTY_MONTHS
 
-    def __init__(self):
+        if expiry and not _date_is_valid(expiry, col.date_format):
+            flags |= _FAULTY_EXPIRY_DATE
 
-        self.update({'Errors found': False,
-                     'Number of missing ISINs': 0,
-                     'Faulty ISINs': set(),
-                     'Missing names': set(),
-                     'Faulty months in report': set(),
-                     'Faulty report expiry dates': set()})
+        if flags:
+            errors.flag(isin, flags)
 
+        return isin, _stock_data(name, eps, months, expiry, own_link, exchange_link)
+
+    def _registry_row_is_addable(self, row, col=_default_columns):
+        '''Checks one stock data in a CSV row.'''
+
+        return self._process_row(row, col)[1] is not None
+
+    def _registry_row_from_csv(self, row, col=_default_columns):
+        '''Processes one stock data from a CSV row, without checking it (so
+        no error is recorded).'''
+
+        name, eps, months, expiry, own_link, exchange_link = col.fields(row)
+
+        return _stock_data(name, eps, sys.intern(months), sys.intern(expiry),
+                           own_link, exchange_link)
+
+@dataclasses.dataclass(slots=True)
+class RegistryErrors:
+    '''Keeps all the error info occuring while processing a registry.
+
+    The errors of each faulty ISIN are kept as bit flags of a single int
+    (see _error_descriptions), instead of one collection per kind of error.'''
+
+    missing_isins: int = 0
+    error_flags: dict = dataclasses.field(default_factory=dict)
+
+    @property
+    def errors_found(self):
+        '''True if any error has been recorded.'''
+
+        return bool(self.missing_isins or self.error_flags)
+
+    def flag(self, isin, flags):
+        '''Records the given error flags for an ISIN.'''
+
+        error_flags = self.error_flags
+        error_flags[isin] = error_flags.get(isin, 0) | flags
+
+    def log(self):
+        '''Logs the errors found, one line per kind of error.'''
+
+        if self.missing_isins:
+            logging.error('Registry: Number of missing ISINs: %d', self.missing_isins)
+
+        isins = {flag: [] for flag, description in _error_descriptions}
+        for isin, flags in self.error_flags.items():
+            for flag in isins:
+                if flags & flag:
+                    isins[flag].append(isin)
+
+        for flag, description in _error_descriptions:
+            if isins[flag]:
+                logging.error('Registry: %s: %s', description, ', '.join(isins[flag]))
+
+def _stock_data(name, eps, months, expiry, own_link, exchange_link):
+    '''Returns the stock data built from the fields of a CSV row. The months
+    and the expiry date are expected to be interned already.'''
+
+    return {'Name' : name,
+            'EPS': _string_to_decimal(eps),
+            'Months in Report': months,
+            'Report Expiry Date': expiry,
+            'Own Investor Link': own_link,
+            'Stock Exchange Link': exchange_link}
+
+@functools.lru_cache(maxsize=4096)
+def _date_is_valid(s, fmt):
+    '''Checks whether a date string matches the given date format. Many
+    stocks share the same dates, so the results are cached.
+
+    The usual 'YYYY.MM.DD' format is checked by a precompiled regex instead
+    of strptime, any other format falls back to strptime.'''
+
+    if fmt == _dot_date_format:
+        match = _dot_date_match(s)
+        if not match:
+            return False
+        year, month, day = map(int, match.groups())
+        return (year >= datetime.MINYEAR and 1 <= month <= 12
+                and 1 <= day <= calendar.monthrange(year, month)[1])
+
+    try:
+        datetime.datetime.strptime(s, fmt)
+    except ValueError:
+        return False
+    return True
+
+@functools.lru_cache(maxsize=None)
 def _string_to_decimal(s):
     '''Universal converter from string to decimal. Accepts either comma or
-    point as decimal mark.'''
+    point as decimal mark.
+
+    EPS values repeat a lot across the registry, so each distinct string is
+    converted only once.'''
 
+    if not s:
+        return _ZERO
     if '.' not in s:
-        s.replace(',', '.')
+        s = s.replace(',', '.')
     try:
-        return decimal.Decimal(s)
-    except decimal.InvalidOperation:
-        return decimal.Decimal('0')
-
-class TestRegistryRowIsAddable(unittest.TestCase):
-    '''Tests _registry_row_is_addable.'''
-
-    def setUp(self):
-        self.reg = Registry()
-
-    def test_missing_isin(self):
-        row = {'ISIN' : ''}
-        expected_errors = RegistryErrorDict()
-        expected_errors.update({'Errors found': True,
-                                'Number of missing ISINs': 1})
-        self.assertFalse(self.reg._registry_row_is_addable(row))
-        self.assertEqual(self.reg['Errors'], expected_errors)
-
-    def test_faulty_isin(self):
-        row = {'ISIN' : '12345678901'}
-        expected_errors = RegistryErrorDict()
-        expected_errors.update({'Errors found': True,
-                                'Faulty ISINs': set(['12345678901'])})
-
-        self.assertFalse(self.reg._registry_row_is_addable(row))
-        self.assertEqual(self.reg['Errors'], expected_errors)
-
-    def test_missing_name(self):
-        row = {'ISIN' : '123456789012',
-               'Name' : '',
-               'Months in Report' : '',
-               'Report Expiry Date' : '2000.01.01'}
-        expected_errors = RegistryErrorDict()
-        expected_errors.update({'Errors found': True,
-                                'Missing names': set(['123456789012'])})
-
-        self.assertTrue(self.reg._registry_row_is_addable(row))
-        self.assertEqual(self.reg['Errors'], expected_errors)
-
-    def test_unacceptable_months(self):
-        row = {'ISIN' : '123456789012',
-               'Name' : 'Company',
-               'Report Expiry Date' : '2000.01.01'}
-        expected_errors = RegistryErrorDict()
-        expected_errors.update({'Errors found': True,
-                                'Faulty months in report': set(['123456789012'])})
-
-        for months in ('X', '4'):
-            row['Months in Report'] = months
-            self.assertTrue(self.reg._registry_row_is_addable(row))
-            self.assertEqual(self.reg['Errors'], expected_errors)
-
-    def test_acceptable_months(self):
-
-        row = {'ISIN' : '123456789012',
-               'Name' : 'Company',
-               'Report Expiry Date' : '2000.01.01'}
-
-        for months in ('', '3', '6', '9', '12'):
-            row['Months in Report'] = months
-            self.assertTrue(self.reg._registry_row_is_addable(row))
-            self.assertEqual(self.reg['Errors'], RegistryErrorDict())
-
-    def test_unacceptable_expiry_date(self):
-        row = {'ISIN' : '123456789012',
-               'Name' : 'Company',
-               'Months in Report' : '',
-               'Report Expiry Date' : '20000.01.01'}
-        expected_errors = RegistryErrorDict()
-        expected_errors.update({'Errors found': True,
-                                'Faulty report expiry dates': set(['123456789012'])})
-        self.assertTrue(self.reg._registry_row_is_addable(row))
-        self.assertEqual(self.reg['Errors'], expected_errors)
-
-    def test_acceptable_expiry_dates(self):
-
-        row = {'ISIN' : '123456789012',
-               'Name' : 'Company',
-               'Months in Report' : ''}
-        for dates in ('', '2000.01.01'):
-            row['Report Expiry Date'] = dates
-            self.assertTrue(self.reg._registry_row_is_addable(row))
-            self.assertEqual(self.reg['Errors'], RegistryErrorDict())
-
-class TestRegistryRowFromCSV(unittest.TestCase):
-    '''Tests _registry_row_from_csv.'''
-
-    def setUp(self):
-        self.reg = Registry()
-        self.acceptable_row = {'ISIN': '123456789012',
-                               'Name' : 'Company',
-                               'EPS': '12.34',
-                               'Months in Report': '3',
-                               'Report Expiry Date': '2000.01.01',
-                               'Own Investor Link': 'http',
-                               'Stock Exchange Link': 'http'}
-        self.result_dict = {'Name' : 'Company',
-                            'EPS': decimal.Decimal('12.34'),
-                            'Months in Report': '3',
-                            'Report Expiry Date': '2000.01.01',
-                            'Own Investor Link': 'http',
-                            'Stock Exchange Link': 'http'}
-
-    def test_acceptable_row(self):
-        self.assertTrue(self.reg._registry_row_is_addable(self.acceptable_row))
-        self.assertEqual(self.reg._registry_row_from_csv(self.acceptable_row),
-                         self.result_dict)
+        return _eps_context.plus(decimal.Decimal(s))
+    except decimal.DecimalException:
+        return _ZERO
 
 def main():
-    '''Entry point for unit testing.'''
+    '''Entry point for testing purposes only'''
 
-    test = TestRegistryRowIsAddable()
+    logging.basicConfig(level=logging.DEBUG)
+    logging.debug('Running modul in debugging mode.')
 
 if __name__ == '__main__':
-    main()
-    unittest.main()
+    sys.exit(main())
@@ -0,0 +1,260 @@
+'''
+Unit tests of the registry library.
+'''
+
+import decimal
+import os
+import sys
+import tempfile
+import types
+import unittest
+import unittest.mock
+from registry import (Registry, RegistryErrors, _header, _string_to_decimal,
+                      _FAULTY_ISIN, _MISSING_NAME, _FAULTY_MONTHS,
+                      _FAULTY_EXPIRY_DATE, _TRUNCATED_ROW)
+
+def _csv_row(fields):
+    '''Returns a CSV row built from a dict, missing fields left empty.'''
+
+    return [fields.get(name, '') for name in _header]
+
+class TestRegistryRowIsAddable(unittest.TestCase):
+    '''Tests _registry_row_is_addable.'''
+
+    def setUp(self):
+        self.reg = Registry()
+
+    def test_missing_isin(self):
+        row = {'ISIN' : ''}
+        expected_errors = RegistryErrors()
+        expected_errors.missing_isins = 1
+        self.assertFalse(self.reg._registry_row_is_addable(_csv_row(row)))
+        self.assertEqual(self.reg.errors, expected_errors)
+        self.assertTrue(self.reg.errors.errors_found)
+
+    def test_faulty_isin(self):
+        row = {'ISIN' : '12345678901'}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'12345678901': _FAULTY_ISIN}
+
+        self.assertFalse(self.reg._registry_row_is_addable(_csv_row(row)))
+        self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_faulty_isin_characters(self):
+        row = {'ISIN' : 'de000540811-'}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'de000540811-': _FAULTY_ISIN}
+
+        self.assertFalse(self.reg._registry_row_is_addable(_csv_row(row)))
+        self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_truncated_row(self):
+        row = ['123456789012', 'Company']
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'123456789012': _TRUNCATED_ROW}
+
+        self.assertFalse(self.reg._registry_row_is_addable(row))
+        self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_missing_name(self):
+        row = {'ISIN' : '123456789012',
+               'Name' : '',
+               'Months in Report' : '',
+               'Report Expiry Date' : '2000.01.01'}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'123456789012': _MISSING_NAME}
+
+        self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+        self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_unacceptable_months(self):
+        row = {'ISIN' : '123456789012',
+               'Name' : 'Company',
+               'Report Expiry Date' : '2000.01.01'}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'123456789012': _FAULTY_MONTHS}
+
+        for months in ('X', '4'):
+            row['Months in Report'] = months
+            self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+            self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_several_errors(self):
+        row = {'ISIN' : '123456789012',
+               'Name' : '',
+               'Months in Report' : 'X',
+               'Report Expiry Date' : '2000.01.01'}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'123456789012': _MISSING_NAME | _FAULTY_MONTHS}
+
+        self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+        self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_acceptable_months(self):
+
+        row = {'ISIN' : '123456789012',
+               'Name' : 'Company',
+               'Report Expiry Date' : '2000.01.01'}
+
+        for months in ('', '3', '6', '9', '12'):
+            row['Months in Report'] = months
+            self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+            self.assertEqual(self.reg.errors, RegistryErrors())
+        self.assertFalse(self.reg.errors.errors_found)
+
+    def test_unacceptable_expiry_date(self):
+        row = {'ISIN' : '123456789012',
+               'Name' : 'Company',
+               'Months in Report' : ''}
+        expected_errors = RegistryErrors()
+        expected_errors.error_flags = {'123456789012': _FAULTY_EXPIRY_DATE}
+
+        for dates in ('20000.01.01', '2000.13.01', '2001.02.29'):
+            row['Report Expiry Date'] = dates
+            self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+            self.assertEqual(self.reg.errors, expected_errors)
+
+    def test_acceptable_expiry_dates(self):
+
+        row = {'ISIN' : '123456789012',
+               'Name' : 'Company',
+               'Months in Report' : ''}
+        for dates in ('', '2000.01.01', '2000.02.29'):
+            row['Report Expiry Date'] = dates
+            self.assertTrue(self.reg._registry_row_is_addable(_csv_row(row)))
+            self.assertEqual(self.reg.errors, RegistryErrors())
+
+class TestRegistryRowFromCSV(unittest.TestCase):
+    '''Tests _registry_row_from_csv.'''
+
+    def setUp(self):
+        self.reg = Registry()
+        self.acceptable_row = {'ISIN': '123456789012',
+                               'Name' : 'Company',
+                               'EPS': '12.34',
+                               'Months in Report': '3',
+                               'Report Expiry Date': '2000.01.01',
+                               'Own Investor Link': 'http',
+                               'Stock Exchange Link': 'http'}
+        self.result_dict = {'Name' : 'Company',
+                            'EPS': decimal.Decimal('12.34'),
+                            'Months in Report': '3',
+                            'Report Expiry Date': '2000.01.01',
+                            'Own Investor Link': 'http',
+                            'Stock Exchange Link': 'http'}
+
+    def test_acceptable_row(self):
+        self.assertTrue(self.reg._registry_row_is_addable(_csv_row(self.acceptable_row)))
+        self.assertEqual(self.reg._registry_row_from_csv(_csv_row(self.acceptable_row)),
+                         self.result_dict)
+        self.assertEqual(self.reg.errors, RegistryErrors())
+
+    def test_no_errors_recorded(self):
+        row = {'ISIN' : '123456789012'}
+        self.reg._registry_row_from_csv(_csv_row(row))
+        self.assertEqual(self.reg.errors, RegistryErrors())
+
+    def test_interned_months(self):
+        self.acceptable_row['Months in Report'] = ''.join(('1', '2'))
+        isin, record = self.reg._process_row(_csv_row(self.acceptable_row))
+        self.assertIs(record['Months in Report'], sys.intern('12'))
+
+    def test_process_row(self):
+        self.assertEqual(self.reg._process_row(_csv_row(self.acceptable_row)),
+                         ('123456789012', self.result_dict))
+        self.assertEqual(self.reg.errors, RegistryErrors())
+
+class TestRegistryErrorsLog(unittest.TestCase):
+    '''Tests RegistryErrors.log.'''
+
+    def test_log(self):
+        errors = RegistryErrors()
+        errors.missing_isins = 2
+        errors.error_flags = {'123456789012': _MISSING_NAME | _FAULTY_MONTHS,
+                              'ABCDEFGHIJKL': _MISSING_NAME,
+                              '12345': _FAULTY_ISIN}
+
+        with self.assertLogs(level='ERROR') as logs:
+            errors.log()
+
+        self.assertEqual(logs.output,
+                         ['ERROR:root:Registry: Number of missing ISINs: 2',
+                          'ERROR:root:Registry: Faulty ISINs: 12345',
+                          'ERROR:root:Registry: Missing names: 123456789012, ABCDEFGHIJKL',
+                          'ERROR:root:Registry: Faulty months in report: 123456789012'])
+
+class TestLoadFromFile(unittest.TestCase):
+    '''Tests load_from_file on a CSV file with reordered columns.'''
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='') as csvfile:
+            csvfile.write('Name;Stock Exchange Link;ISIN;Report Expiry Date;'
+                          'Own Investor Link;Months in Report;EPS\r\n'
+                          'Company;http://exchange;123456789012;2000.01.01;'
+                          'http://own;3;1,5\r\n'
+                          '\r\n'
+                          ';;ABCDEFGHIJKL;;;4;\r\n'
+                          'Faulty;;12345;;;;\r\n'
+                          'Company;http\r\n'
+                          'Company;http;DE0005408116\r\n')
+        self.config = types.SimpleNamespace(registry_filename=self.filename,
+                                            date_format='%Y.%m.%d')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_load_from_file(self):
+        reg = Registry()
+        with unittest.mock.patch('registry._config', return_value=self.config), \
+             self.assertLogs(level='ERROR'):
+            reg.load_from_file()
+
+        self.assertEqual(sorted(reg), ['123456789012', 'ABCDEFGHIJKL'])
+        self.assertEqual(reg['123456789012'],
+                         {'Name' : 'Company',
+                          'EPS': decimal.Decimal('1.5'),
+                          'Months in Report': '3',
+                          'Report Expiry Date': '2000.01.01',
+                          'Own Investor Link': 'http://own',
+                          'Stock Exchange Link': 'http://exchange'})
+        self.assertEqual(reg['ABCDEFGHIJKL']['EPS'], decimal.Decimal('0'))
+        self.assertIsNone(reg.get('12345'))
+        self.assertEqual(dict(reg.items()), {isin: reg[isin] for isin in reg.keys()})
+
+        expected_errors = RegistryErrors()
+        expected_errors.missing_isins = 1
+        expected_errors.error_flags = {'ABCDEFGHIJKL': _MISSING_NAME | _FAULTY_MONTHS,
+                                       '12345': _FAULTY_ISIN,
+                                       'DE0005408116': _TRUNCATED_ROW}
+        self.assertEqual(reg.errors, expected_errors)
+
+    def test_configured_date_format(self):
+        reg = Registry()
+        self.config.date_format = '%d/%m/%Y'
+        with unittest.mock.patch('registry._config', return_value=self.config), \
+             self.assertLogs(level='ERROR'):
+            reg.load_from_file()
+
+        self.assertEqual(reg.errors.error_flags['123456789012'], _FAULTY_EXPIRY_DATE)
+
+class TestStringToDecimal(unittest.TestCase):
+    '''Tests _string_to_decimal.'''
+
+    def test_decimal_marks(self):
+        for s in ('12.34', '12,34'):
+            self.assertEqual(_string_to_decimal(s), decimal.Decimal('12.34'))
+
+    def test_whitespace_and_underscores(self):
+        for s, expected in (('2.08 ', '2.08'), (' 2,08', '2.08'), ('1_000', '1000')):
+            self.assertEqual(_string_to_decimal(s), decimal.Decimal(expected))
+
+    def test_precision(self):
+        self.assertEqual(_string_to_decimal('1,23456789012'), decimal.Decimal('1.23456789'))
+
+    def test_empty_or_invalid(self):
+        for s in ('', 'X', '1e1000000', '9' * 30 + 'e999990'):
+            self.assertEqual(_string_to_decimal(s), decimal.Decimal('0'))
+
+if __name__ == '__main__':
+    unittest.main()